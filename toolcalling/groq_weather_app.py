@@ -1,56 +1,242 @@
 # # Function Calling with OpenAI APIs
 
+import io
 import os
-import json
-import requests
+import re
+import sys
+import time
+import random
+import shelve
+import hashlib
+import threading
+import contextlib
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated
+from urllib.parse import urlencode
+
+import httpx
+import orjson
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field, StringConstraints, ValidationError
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; fall back to no cross-process lock
+    fcntl = None
 
 load_dotenv()
 
-from groq import Groq
+# Read the weather API key once; fail fast rather than building URLs without it
+_OWM_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+if not _OWM_KEY:
+    raise RuntimeError("OPENWEATHERMAP_API_KEY is not set; add it to your environment or .env file")
+
+from groq import Groq, DefaultHttpxClient, Stream
+from groq.types.chat import ChatCompletion, ChatCompletionChunk
+
+# Keep idle connections open long enough to survive the user typing a question
+KEEPALIVE_EXPIRY = 60.0  # seconds
+
+# Own the Groq HTTP client so its connection can be warmed between turns
+_groq_http = DefaultHttpxClient(
+    limits=httpx.Limits(max_keepalive_connections=4, max_connections=8, keepalive_expiry=KEEPALIVE_EXPIRY),
+)
 
 client = Groq(
     api_key=os.getenv("GROQ_API_KEY"),
+    http_client=_groq_http,
 )
 
 
+# Shared HTTP/2 client; geocoding and weather requests multiplex over one pooled connection
+_client = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=4, max_connections=8, keepalive_expiry=KEEPALIVE_EXPIRY),
+    timeout=5.0,
+)
+
+# Best-effort connection warm-ups run on their own worker so they never
+# delay the weather lookups started mid-stream
+_warmup_executor = ThreadPoolExecutor(max_workers=1)
+_lookup_executor = ThreadPoolExecutor(max_workers=4)
+_warmup_future = None
+
+
+def _warm_connections():
+    """Open (or keep alive) connections to the Groq and weather hosts"""
+    for http, url in ((_groq_http, str(client.base_url)), (_client, "https://api.openweathermap.org")):
+        try:
+            http.head(url, timeout=5.0)
+        except httpx.HTTPError:
+            # Warm-up is best effort; real requests report their own failures
+            pass
+
+
+def _schedule_warmup():
+    """Start a connection warm-up unless the previous one is still running"""
+    global _warmup_future
+    if _warmup_future is None or _warmup_future.done():
+        _warmup_future = _warmup_executor.submit(_warm_connections)
+
+
+# OpenWeatherMap endpoints; query strings are added with urlencode
+GEO_URL = "https://api.openweathermap.org/geo/1.0/direct"
+WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+# Retry transient failures instead of surfacing them to the LLM
+RETRY_TOTAL = 2
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def _get_with_retry(http, url):
+    """GET a URL, retrying connection errors and transient statuses with jittered backoff"""
+    for attempt in range(RETRY_TOTAL + 1):
+        try:
+            response = http.get(url)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == RETRY_TOTAL:
+                return response
+        except httpx.TransportError:
+            if attempt == RETRY_TOTAL:
+                raise
+        # Exponential backoff with full jitter so parallel lookups don't retry in lockstep
+        time.sleep(random.uniform(0, RETRY_BACKOFF_FACTOR * (2 ** attempt)))
+
+
+# In-memory caches keyed on the normalized location string
+GEO_CACHE_TTL = 86400  # seconds; coordinates for a place rarely change
+WEATHER_CACHE_TTL = 600  # seconds; current weather changes slowly enough for chat
+CACHE_MAX_ENTRIES = 256  # per cache; least recently used entries are evicted
+_geo_cache = OrderedDict()  # key -> (timestamp, (lat, lon))
+_weather_cache = OrderedDict()  # key -> (timestamp, weather dict)
+_cache_lock = threading.Lock()  # batch lookups touch the caches from worker threads
+
+
+def _cache_get(cache, key, ttl):
+    """Return a fresh cached value (marking it recently used), dropping it if expired"""
+    with _cache_lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] >= ttl:
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return entry[1]
+
+
+def _cache_put(cache, key, value):
+    """Store a value, evicting the least recently used entry past CACHE_MAX_ENTRIES"""
+    with _cache_lock:
+        cache[key] = (time.time(), value)
+        cache.move_to_end(key)
+        if len(cache) > CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+
+def _normalize_location(location):
+    """Normalize a location so "New York" and "new york " share a cache entry"""
+    return unicodedata.normalize("NFKD", location).casefold().strip()
+
+
+# Geocode results persisted across runs; coordinates for a place don't change
+GEO_DISK_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "groq_weather")
+GEO_DISK_CACHE_PATH = os.path.join(GEO_DISK_CACHE_DIR, "geo.db")
+
+
+def _geo_disk_key(normalized_location):
+    """Build a versioned, fixed-length key for the disk geocode cache"""
+    state = f"openweather-geo-v1|{normalized_location}"
+    return hashlib.blake2b(state.encode()).hexdigest()
+
+
+@contextlib.contextmanager
+def _geo_disk_cache(write=False):
+    """Open the disk geocode cache, shared for reads and exclusive for writes"""
+    os.makedirs(GEO_DISK_CACHE_DIR, exist_ok=True)
+    with open(GEO_DISK_CACHE_PATH + ".lock", "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+        try:
+            with shelve.open(GEO_DISK_CACHE_PATH, flag="c" if write else "r") as cache:
+                yield cache
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _load_geo_from_disk(normalized_location):
+    """Return cached (lat, lon) from disk, or None on a miss or unusable cache"""
+    try:
+        with _geo_disk_cache() as cache:
+            return cache.get(_geo_disk_key(normalized_location))
+    except Exception:
+        # The disk cache is best effort; fall back to the geocoding API
+        return None
+
+
+def _save_geo_to_disk(normalized_location, coords):
+    """Persist (lat, lon) for a location; failures only cost a future lookup"""
+    try:
+        with _geo_disk_cache(write=True) as cache:
+            cache[_geo_disk_key(normalized_location)] = coords
+    except Exception:
+        # The disk cache is best effort; the next run just geocodes again
+        pass
+
+
 # 1. Define Function to fetch context
 
-# Get the current weather
-def get_current_weather(location):
-    """Get the current weather in a given location"""
+# Get the current weather for a single location
+def _fetch_one(location, http):
+    """Fetch the current weather for one location as a dict"""
     # First get coordinates using Geocoding API
-    api_key = os.getenv("OPENWEATHERMAP_API_KEY")
-    
+    cache_key = _normalize_location(location)
+
+    # Serve recent results straight from memory
+    cached = _cache_get(_weather_cache, cache_key, WEATHER_CACHE_TTL)
+    if cached is not None:
+        return cached
+
     # Geocoding API to get lat/lon
     try:
-        geo_url = f"http://api.openweathermap.org/geo/1.0/direct?q={location}&limit=1&appid={api_key}"
-        geo_response = requests.get(geo_url)
-        geo_data = geo_response.json()
-        
- 
-        # If still no results, return error
-        if not geo_data:
-            return json.dumps({"error": f"Location '{location}' not found"})
-        
-        # Extract coordinates
-        lat = geo_data[0]['lat']
-        lon = geo_data[0]['lon']
-        
+        cached = _cache_get(_geo_cache, cache_key, GEO_CACHE_TTL)
+        if cached is not None:
+            lat, lon = cached
+        elif (coords := _load_geo_from_disk(cache_key)) is not None:
+            lat, lon = coords
+            _cache_put(_geo_cache, cache_key, coords)
+        else:
+            geo_url = GEO_URL + "?" + urlencode({"q": location.strip(), "limit": 1, "appid": _OWM_KEY})
+            geo_response = _get_with_retry(http, geo_url)
+            geo_data = orjson.loads(geo_response.content)
+            
+     
+            # If still no results, return error
+            if not geo_data:
+                return {"error": f"Location '{location}' not found"}
+            
+            # Extract coordinates
+            lat = geo_data[0]['lat']
+            lon = geo_data[0]['lon']
+            _cache_put(_geo_cache, cache_key, (lat, lon))
+            _save_geo_to_disk(cache_key, (lat, lon))
+
         # Use the free Current Weather API endpoint
-        weather_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&units=metric&appid={api_key}"
-        weather_response = requests.get(weather_url)
-        weather_data = weather_response.json()
+        weather_url = WEATHER_URL + "?" + urlencode({"lat": lat, "lon": lon, "units": "metric", "appid": _OWM_KEY})
+        weather_response = _get_with_retry(http, weather_url)
+        weather_data = orjson.loads(weather_response.content)
         
         # Check if we got a valid response
         if weather_data.get('cod') != 200:
             error_message = weather_data.get('message', 'Unknown error')
-            print(f"API Error: {error_message}")
-            return json.dumps({
+            return {
                 "error": "Weather API error",
                 "message": error_message,
                 "status_code": weather_data.get('cod')
-            })
+            }
         
         # Extract relevant information
         weather = {
@@ -64,17 +250,33 @@ def get_current_weather(location):
             }
         }
         
-        return json.dumps(weather)
+        _cache_put(_weather_cache, cache_key, weather)
+        return weather
         
-    except requests.exceptions.RequestException as e:
-        print(f"Network error: {str(e)}")
-        return json.dumps({"error": "Network error", "message": str(e)})
+    # Errors are returned to the caller, which reports them in the turn's output
+    except httpx.HTTPError as e:
+        return {"error": "Network error", "message": str(e)}
     except KeyError as e:
-        print(f"Data error: {str(e)}")
-        return json.dumps({"error": "Data parsing error", "message": f"Missing field: {str(e)}"})
+        return {"error": "Data parsing error", "message": f"Missing field: {str(e)}"}
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        return json.dumps({"error": "Unexpected error", "message": str(e)})
+        return {"error": "Unexpected error", "message": str(e)}
+
+
+def _fetch_many(locations):
+    """Fetch the current weather for several locations as a list of dicts"""
+    # Fetch every location concurrently so the batch takes as long as the slowest one
+    if len(locations) > 1:
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            return list(ex.map(lambda loc: _fetch_one(loc, _client), locations))
+    return [_fetch_one(loc, _client) for loc in locations]
+
+
+# Get the current weather for one or more locations
+def get_current_weather(locations):
+    """Get the current weather in the given locations as a JSON array"""
+    if isinstance(locations, str):
+        locations = [locations]
+    return orjson.dumps(_fetch_many(locations)).decode()
 
 
 # ### Define Functions
@@ -90,21 +292,242 @@ tools = [
         "type": "function",
         "function": {
             "name": "get_current_weather",
-            "description": "Get the current weather in a given location",
+            "description": "Get the current weather in one or more locations",
             "parameters": {
                 "type": "object",
                 "properties": {
-                    "location": {
-                        "type": "string",
-                        "description": "The city and state, e.g. San Francisco, CA",
+                    "locations": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Every location asked about, each as city and state, e.g. [\"San Francisco, CA\", \"Paris, France\"]",
                     }
                 },
-                "required": ["location"],
+                "required": ["locations"],
             },
         },   
     }
 ]
 
+
+class WeatherArgs(BaseModel):
+    """Arguments the LLM must produce when calling get_current_weather"""
+    locations: list[Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]] = Field(min_length=1)
+
+
+# The tools schema is static, so serialize it once instead of on every request
+_TOOLS_JSON = orjson.dumps(tools)
+
+# Small, fast model decides on tool use; the larger model writes the answer
+ROUTER_MODEL = "llama3-8b-8192"
+ANSWER_MODEL = "llama3-70b-8192"
+ROUTER_MAX_TOKENS = 64  # enough for tool arguments or a short refusal
+ROUTER_RETRY_MAX_TOKENS = 256  # room for a long location list that was cut off
+
+# Reply used for anything that isn't a weather question
+_OFF_TOPIC_REPLY = "I can only answer questions about current weather. Please ask me about the weather in a specific location."
+
+# Clear system prompt to guide the LLM's behavior
+_SYSTEM_PROMPT = f"""You are a helpful weather assistant. 
+- ONLY answer questions related to current weather.
+- If the user asks about something unrelated to weather, respond with: "{_OFF_TOPIC_REPLY}"
+- If there's an error fetching weather data, clearly communicate that to the user without making up information.
+- Never hallucinate or make up weather information.
+- Don't provide forecasts unless that data is explicitly available.
+"""
+
+# Messages shared by every request; built once and copied into each turn
+_BASE_MESSAGES = ({"role": "system", "content": _SYSTEM_PROMPT},)
+
+# Small talk that never needs the LLM
+_CHITCHAT = {"hi", "hello", "hey", "thanks", "thank you", "ok", "cool"}
+
+
+def _is_chitchat(user_query):
+    """Return True for greetings and inputs too short to be a weather question"""
+    text = user_query.strip().lower().strip("!.?, ")
+    return len(text) < 3 or text in _CHITCHAT
+
+
+# Obvious "weather in X" questions are answered without the routing completion
+_WEATHER_RE = re.compile(
+    r"weather (?:like )?(?:in|at|for) ([A-Za-z ,.'-]+?)"
+    r"(?:\s+(?:like|please|today|right now|now|currently|at the moment))*\s*[?.!]*$",
+    re.I,
+)
+
+# Captures that list several places or aren't plain place names are left to the
+# LLM; commas are kept since "City, Region" is the form the tool schema asks for
+_NOT_A_SINGLE_PLACE_RE = re.compile(
+    r"\b(?:and|or|in|at|for|like|tomorrow|tonight|week|weekend|forecast)\b",
+    re.I,
+)
+
+
+def _weather_tool_call(call_id, locations):
+    """Build a single assistant get_current_weather call covering every location"""
+    return {
+        "id": call_id,
+        "type": "function",
+        "function": {
+            "name": "get_current_weather",
+            "arguments": orjson.dumps({"locations": locations}).decode(),
+        },
+    }
+
+
+def _stream_routing_completion(messages):
+    """Stream the router model's decision, starting the weather lookup as soon as its arguments parse
+
+    Returns the reply text, its finish reason, the assembled tool calls and a dict mapping the position
+    of each get_current_weather call whose arguments were complete to the future
+    fetching its locations.
+    """
+    body = orjson.dumps({
+        "model": ROUTER_MODEL,
+        "messages": messages,
+        "temperature": 0,
+        "max_tokens": ROUTER_MAX_TOKENS,
+        "tool_choice": "auto",  # Let the model decide whether to use the tool
+        "stream": True,
+    })
+    # Splice the cached tools JSON into the request object before its closing brace
+    body = body[:-1] + b',"tools":' + _TOOLS_JSON + b"}"
+    stream = client.post(
+        "/openai/v1/chat/completions",
+        cast_to=ChatCompletion,
+        content=body,
+        stream=True,
+        stream_cls=Stream[ChatCompletionChunk],
+    )
+
+    content = []
+    tool_calls = {}  # index -> tool call assembled from streamed deltas
+    weather_futures = {}  # tool call index -> future for its locations
+    finish_reason = None
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        finish_reason = chunk.choices[0].finish_reason or finish_reason
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content.append(delta.content)
+        for tool_delta in delta.tool_calls or ():
+            call = tool_calls.setdefault(tool_delta.index, {
+                "id": None,
+                "type": "function",
+                "function": {"name": "", "arguments": ""},
+            })
+            if tool_delta.id:
+                call["id"] = tool_delta.id
+            if tool_delta.function:
+                call["function"]["name"] += tool_delta.function.name or ""
+                call["function"]["arguments"] += tool_delta.function.arguments or ""
+
+        # Kick off each weather lookup while the rest of the stream is still arriving
+        for index, call in tool_calls.items():
+            if index in weather_futures or call["function"]["name"] != "get_current_weather":
+                continue
+            try:
+                args = WeatherArgs.model_validate_json(call["function"]["arguments"])
+            except ValidationError:
+                continue  # arguments are still partial (or malformed)
+            weather_futures[index] = _lookup_executor.submit(_fetch_many, args.locations)
+
+    # Report futures by position in the returned list rather than by stream index
+    order = sorted(tool_calls)
+    futures = {position: weather_futures[index] for position, index in enumerate(order) if index in weather_futures}
+    return "".join(content), finish_reason, [tool_calls[index] for index in order], futures
+
+
+def _retry_weather_args(messages):
+    """Re-ask the router for locations in JSON mode after a malformed tool call
+
+    Returns the validated locations, or None if the retry is malformed too.
+    """
+    response = client.chat.completions.create(
+        model=ROUTER_MODEL,
+        messages=[
+            *messages,
+            {
+                "role": "system",
+                "content": 'Reply only with a JSON object of the form {"locations": ["City, Region"]} listing every location the user asked about.'
+            }
+        ],
+        temperature=0,
+        max_tokens=ROUTER_RETRY_MAX_TOKENS,
+        response_format={"type": "json_object"}
+    )
+    try:
+        return WeatherArgs.model_validate_json(response.choices[0].message.content or "").locations
+    except ValidationError:
+        return None
+
+
+def _answer_with_weather(messages, tool_call, weather_data, out):
+    """Send the weather tool result back to the LLM and stream its answer"""
+    second_response = client.chat.completions.create(
+        model=ANSWER_MODEL,
+        messages=[
+            *messages,
+            {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [tool_call]
+            },
+            {
+                "role": "tool",
+                "tool_call_id": tool_call["id"],
+                "content": weather_data
+            }
+        ],
+        temperature=0.7,
+        max_tokens=300,
+        stream=True
+    )
+
+    # Print the final response as it is generated
+    print("\nAnswer:", file=out)
+    return _print_stream(second_response, out)
+
+
+def _answer_without_tool(messages, out):
+    """Have the answer model reply when the router's text reply was cut off"""
+    response = client.chat.completions.create(
+        model=ANSWER_MODEL,
+        messages=messages,
+        temperature=0.7,
+        max_tokens=300,
+        stream=True
+    )
+
+    print("\nAnswer:", file=out)
+    return _print_stream(response, out)
+
+
+def _flush_output(out):
+    """Write the buffered output for this turn to stdout in one call"""
+    sys.stdout.write(out.getvalue())
+    sys.stdout.flush()
+    out.seek(0)
+    out.truncate()
+
+
+def _print_stream(stream, out):
+    """Print streamed completion tokens as they arrive and return the full text"""
+    # Buffered status lines must appear before the first token
+    _flush_output(out)
+    parts = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            print(delta, end="", flush=True)
+            parts.append(delta)
+    print(file=out)
+    return "".join(parts)
+
+
 # Only run this section when the script is executed directly
 if __name__ == "__main__":
     print("Weather Information Assistant")
@@ -112,91 +535,106 @@ if __name__ == "__main__":
     print("Ask about weather in any location, or type 'exit' to quit.\n")
     
     while True:
+        # DNS/TCP/TLS setup for the next turn overlaps with the user typing
+        _schedule_warmup()
         user_query = input("Your question: ")
         
         if user_query.lower() in ['exit', 'quit', 'bye']:
             print("Goodbye!")
             break
         
+        # Collect this turn's output and write it in one go
+        out = io.StringIO()
+
+        # Answer small talk locally instead of spending an LLM call on it
+        if _is_chitchat(user_query):
+            print("\nAnswer:", file=out)
+            print(_OFF_TOPIC_REPLY, file=out)
+            print("\n" + "-" * 50 + "\n", file=out)
+            _flush_output(out)
+            continue
+
         try:
-            # Clear system prompt to guide the LLM's behavior
-            system_prompt = """You are a helpful weather assistant. 
-            - ONLY answer questions related to current weather.
-            - If the user asks about something unrelated to weather, respond with: "I can only answer questions about current weather. Please ask me about the weather in a specific location."
-            - If there's an error fetching weather data, clearly communicate that to the user without making up information.
-            - Never hallucinate or make up weather information.
-            - Don't provide forecasts unless that data is explicitly available.
-            """
-            
+            messages = [*_BASE_MESSAGES, {"role": "user", "content": user_query}]
+
+            # Skip the routing completion when the question is clearly about weather
+            match = _WEATHER_RE.search(user_query.strip())
+            location = match.group(1).strip(" ,.'-") if match else ""
+            if location and not _NOT_A_SINGLE_PLACE_RE.search(location):
+                weather_data = get_current_weather(location)
+
+                # On lookup errors fall back to letting the LLM pick the location
+                if not any("error" in result for result in orjson.loads(weather_data)):
+                    print("\nProcessing your question...", file=out)
+                    print(f"Getting weather for: {location}", file=out)
+                    tool_call = _weather_tool_call("prefetch_get_current_weather", [location])
+                    _answer_with_weather(messages, tool_call, weather_data, out)
+                    print("\n" + "-" * 50 + "\n", file=out)
+                    _flush_output(out)
+                    continue
+
             # First response to determine if it's a weather question and call the function
-            response = client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_query}
-                ],
-                temperature=0,
-                max_tokens=300,
-                tools=tools,
-                tool_choice="auto"  # Let the model decide whether to use the tool
-            )
-            
-            groq_response = response.choices[0].message
-            print("\nProcessing your question...")
+            content, finish_reason, tool_calls, weather_futures = _stream_routing_completion(messages)
+            print("\nProcessing your question...", file=out)
             
             # Check if the model decided to use the tool
-            if groq_response.tool_calls:
-                # Extract the location from the function call
-                tool_call = groq_response.tool_calls[0]
-                if tool_call.function.name == "get_current_weather":
-                    args = json.loads(tool_call.function.arguments)
-                    location = args.get("location", "")
-                    print(f"Getting weather for: {location}")
+            if tool_calls:
+                # Small models may emit one call per city; merge them into one batch
+                weather_indices = [
+                    index for index, call in enumerate(tool_calls)
+                    if call["function"]["name"] == "get_current_weather"
+                ]
+                weather_calls = [tool_calls[index] for index in weather_indices]
+                if weather_calls:
+                    # Validate cheaply and retry in JSON mode instead of failing the turn
+                    try:
+                        locations = [
+                            location
+                            for call in weather_calls
+                            for location in WeatherArgs.model_validate_json(call["function"]["arguments"]).locations
+                        ]
+                    except ValidationError:
+                        locations = _retry_weather_args(messages)
+                        weather_futures = {}
+
+                if weather_calls and locations is None:
+                    print("\nAnswer:", file=out)
+                    print("I couldn't tell which location you meant. Please ask about the weather in a specific location.", file=out)
+                elif weather_calls:
+                    tool_call = _weather_tool_call(weather_calls[0]["id"], locations)
+                    print(f"Getting weather for: {', '.join(locations)}", file=out)
                     
-                    # Call the weather function
-                    weather_data = get_current_weather(**args)
+                    # Collect the lookups started mid-stream, or call the weather function now
+                    if all(index in weather_futures for index in weather_indices):
+                        results = [result for index in weather_indices for result in weather_futures[index].result()]
+                        weather_data = orjson.dumps(results).decode()
+                    else:
+                        weather_data = get_current_weather(locations)
                     
                     # Check if there was an error
-                    weather_json = json.loads(weather_data)
-                    if "error" in weather_json:
-                        error_info = f"Error: {weather_json.get('message', 'Unknown error')}"
-                        print(error_info)
+                    for weather_json in orjson.loads(weather_data):
+                        if "error" in weather_json:
+                            error_info = f"Error: {weather_json.get('message', weather_json['error'])}"
+                            print(error_info, file=out)
                     
                     # Send the result back to the LLM
-                    second_response = client.chat.completions.create(
-                        model="llama3-70b-8192",
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_query},
-                            {
-                                "role": "assistant",
-                                "content": None,
-                                "tool_calls": groq_response.tool_calls
-                            },
-                            {
-                                "role": "tool",
-                                "tool_call_id": tool_call.id,
-                                "content": weather_data
-                            }
-                        ],
-                        temperature=0.7,
-                        max_tokens=300
-                    )
-                    
-                    # Print the final response
-                    print("\nAnswer:")
-                    print(second_response.choices[0].message.content)
+                    _answer_with_weather(messages, tool_call, weather_data, out)
                 else:
                     # Unknown tool call
-                    print("\nAnswer:")
-                    print("I'm not sure how to handle that request. Please ask about the weather in a specific location.")
+                    print("\nAnswer:", file=out)
+                    print("I'm not sure how to handle that request. Please ask about the weather in a specific location.", file=out)
             else:
-                # Model chose not to use the tool - likely not a weather question
-                print("\nAnswer:")
-                print(groq_response.content)
+                # Model chose not to use the tool - likely not a weather question.
+                # Only a reply cut off by the router's token cap needs the answer model.
+                if finish_reason == "length":
+                    _answer_without_tool(messages, out)
+                else:
+                    print("\nAnswer:", file=out)
+                    print(content, file=out)
         
         except Exception as e:
-            print(f"\nAn error occurred: {str(e)}")
-            print("Please try again with a different question.")
+            print(f"\nAn error occurred: {str(e)}", file=out)
+            print("Please try again with a different question.", file=out)
         
-        print("\n" + "-" * 50 + "\n")
+        print("\n" + "-" * 50 + "\n", file=out)
+        _flush_output(out)